@@ -1,31 +1,154 @@
 import os
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import numpy as np
 import pandas as pd
 import requests
-from typing import Optional, Dict, Tuple, Any
+from requests.adapters import HTTPAdapter
+from typing import Optional, Dict, Any
 from sec_edgar_config import SEC_HEADERS
 
-def match_ticker_to_cik(tckr: str) -> str:
-    ticker = tckr.upper().replace(".", "-")
-
-    ticker_json = requests.get(
-        "https://www.sec.gov/files/company_tickers.json", headers=SEC_HEADERS
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    _json_loads = json.loads
+
+# Shared session so repeated calls to sec.gov reuse pooled keep-alive connections
+_SESSION = requests.Session()
+_SESSION.headers.update(SEC_HEADERS)
+_SESSION.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+
+# SEC EDGAR fair-access policy allows at most 10 requests per second per client
+SEC_MAX_REQUESTS_PER_SECOND = 10
+_RATE_LOCK = threading.Lock()
+_next_request_at = 0.0
+
+def _throttle() -> None:
+    # Space requests at least 1 / SEC_MAX_REQUESTS_PER_SECOND apart across threads
+    global _next_request_at
+    with _RATE_LOCK:
+        now = time.monotonic()
+        wait = _next_request_at - now
+        _next_request_at = max(now, _next_request_at) + 1 / SEC_MAX_REQUESTS_PER_SECOND
+    if wait > 0:
+        time.sleep(wait)
+
+@lru_cache(maxsize=1)
+def _fetch_company_tickers() -> Dict[str, str]:
+    # ticker -> zero-padded CIK, downloaded once per process
+    _throttle()
+    ticker_json = _SESSION.get(
+        "https://www.sec.gov/files/company_tickers.json", timeout=30
     )
     ticker_json.raise_for_status()
-    data = ticker_json.json()
+    data = _json_loads(ticker_json.content)
+
+    return {
+        company["ticker"]: str(company["cik_str"]).zfill(10)
+        for company in data.values()
+    }
+
+@lru_cache(maxsize=None)
+def match_ticker_to_cik(tckr: str) -> str:
+    ticker = tckr.upper().replace(".", "-")
 
-    for company in data.values():
-        if company["ticker"] == ticker:
-            cik = str(company["cik_str"]).zfill(10)
-            return cik
+    cik = _fetch_company_tickers().get(ticker)
+    if cik is not None:
+        return cik
     
     raise ValueError(f"{ticker} not found.")
 
-def get_stock_based_compensation(ticker: str, period: str = "annual") -> pd.DataFrame:
-    cik = match_ticker_to_cik(ticker)
+@lru_cache(maxsize=None)
+def _fetch_companyfacts(cik: str) -> Dict[str, Any]:
+    # Cached per CIK; callers must treat the returned JSON as read-only
     url = f"https://data.sec.gov/api/xbrl/companyfacts/CIK{cik}.json"
-    r = requests.get(url, headers=SEC_HEADERS)
+    _throttle()
+    r = _SESSION.get(url, timeout=30)
     r.raise_for_status()
-    company_facts = r.json()
+    return _json_loads(r.content)
+
+def fetch_all(tickers: list, max_workers: int = 8) -> Dict[str, Dict[str, Any]]:
+    """
+    Prefetch companyfacts for several tickers concurrently.
+
+    Requests share the module session and are throttled to
+    SEC_MAX_REQUESTS_PER_SECOND. Results land in the companyfacts cache, so
+    later get_* calls for these tickers make no further network requests.
+
+    Best-effort: tickers whose CIK lookup or download fails are skipped, and the
+    error surfaces again from the later get_* call for that ticker.
+
+    Args:
+        tickers: e.g., ["UBER", "LYFT"]
+        max_workers: number of concurrent download threads
+
+    Returns:
+        Dict mapping each successfully fetched ticker to its companyfacts JSON.
+    """
+    # Resolve CIKs up front so the workers only issue companyfacts requests
+    ciks = {}
+    for ticker in tickers:
+        try:
+            ciks[ticker] = match_ticker_to_cik(ticker)
+        except (ValueError, requests.RequestException):
+            continue
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {ticker: executor.submit(_fetch_companyfacts, cik) for ticker, cik in ciks.items()}
+        for ticker, future in futures.items():
+            try:
+                results[ticker] = future.result()
+            except (ValueError, requests.RequestException):
+                continue
+    return results
+
+def _to_row_frame(label: str, series: pd.Series) -> pd.DataFrame:
+    # Single-row DataFrame with period end dates as columns, most recent first
+    series = series.sort_index(ascending=False)
+    vals = series.to_numpy(dtype=np.float64).reshape(1, -1)
+    return pd.DataFrame(vals, index=[label], columns=pd.DatetimeIndex(series.index))
+
+def _fp_ok(fp: Optional[str], period: str) -> bool:
+    if period == "annual":
+        return fp == "FY"
+    return isinstance(fp, str) and fp.startswith("Q")
+
+def _facts_frame(
+    items: list,
+    period: str,
+    allowed_forms: set,
+    fp_optional: bool = False,
+) -> pd.DataFrame:
+    # Filter facts while reading them so only matching (end, val, filed) rows are
+    # materialized. A missing form is always allowed; a missing fp only if fp_optional.
+    rows = (
+        (item["end"], item["val"], item.get("filed") or "")
+        for item in items
+        if item.get("end") is not None
+        and item.get("val") is not None
+        and (not item.get("form") or item["form"] in allowed_forms)
+        and ((fp_optional and item.get("fp") is None) or _fp_ok(item.get("fp"), period))
+    )
+    return pd.DataFrame.from_records(rows, columns=["end", "val", "filed"])
+
+def _latest_filed(df: pd.DataFrame) -> pd.Series:
+    # end -> val, preferring the latest filed date when an end date is duplicated
+    # (stable sort keeps the first-seen fact on ties)
+    return (
+        df.sort_values("filed", ascending=False, kind="stable")
+        .groupby("end", sort=False)["val"]
+        .first()
+        .astype(float)
+    )
+
+def get_stock_based_compensation(ticker: str, period: str = "annual") -> pd.DataFrame:
+    cik = match_ticker_to_cik(ticker)
+    company_facts = _fetch_companyfacts(cik)
 
     facts = company_facts.get("facts", {}).get("us-gaap", {})
 
@@ -36,12 +159,10 @@ def get_stock_based_compensation(ticker: str, period: str = "annual") -> pd.Data
         "ShareBasedCompensation",
     ]
 
-    def fp_ok(fp: str | None) -> bool:
-        if period == "annual":
-            return fp == "FY"
-        return isinstance(fp, str) and fp.startswith("Q")
+    # Optional: filter to primary forms
+    allowed_forms = {"10-K", "10-K/A"} if period == "annual" else {"10-Q", "10-Q/A"}
 
-    series = {}
+    series = pd.Series(dtype=float)
 
     for tag in candidate_tags:
         concept = facts.get(tag)
@@ -53,59 +174,30 @@ def get_stock_based_compensation(ticker: str, period: str = "annual") -> pd.Data
         if not usd_items:
             continue
 
-        for item in usd_items:
-            if not fp_ok(item.get("fp")):
-                continue
+        items_df = _facts_frame(usd_items, period, allowed_forms)
 
-            # Optional: filter to primary forms
-            form = item.get("form")
-            if period == "annual" and form not in (None, "10-K", "10-K/A"):
-                continue
-            if period != "annual" and form not in (None, "10-Q", "10-Q/A"):
-                continue
-
-            end = item.get("end")
-            val = item.get("val")
-            if end is None or val is None:
-                continue
-
-            # If duplicates exist for same end, prefer latest filed date
-            filed = item.get("filed")  # YYYY-MM-DD
-            prev = series.get(end)
-            if prev is None or (filed and filed > prev["filed"]):
-                series[end] = {"val": float(val), "filed": filed or ""}
+        # If duplicates exist for same end, prefer latest filed date
+        series = _latest_filed(items_df)
 
         # if we found data in this preferred tag, stop searching fallbacks
-        if series:
+        if not series.empty:
             break
 
-    if not series:
+    if series.empty:
         raise ValueError(f"No stock-based compensation data found for CIK {cik}")
 
-    # flatten to end -> value
-    data = {"Stock-Based Compensation": {end: d["val"] for end, d in series.items()}}
-    df = pd.DataFrame(data).T.sort_index(axis=1, ascending=False).fillna(0)
-    return df
+    return _to_row_frame("Stock-Based Compensation", series)
 
 def get_cashflow_sbc(ticker: str, period: str = "annual") -> pd.DataFrame:
     cik = match_ticker_to_cik(ticker)
-
-    url = f"https://data.sec.gov/api/xbrl/companyfacts/CIK{cik}.json"
-    r = requests.get(url, headers=SEC_HEADERS)
-    r.raise_for_status()
-    facts = r.json().get("facts", {}).get("us-gaap", {})
+    facts = _fetch_companyfacts(cik).get("facts", {}).get("us-gaap", {})
 
     # Cash flow add-back is most commonly tagged this way
     preferred_tags = ["ShareBasedCompensation", "StockBasedCompensation"]
 
-    def fp_ok(fp: str | None) -> bool:
-        if period == "annual":
-            return fp == "FY"
-        return isinstance(fp, str) and fp.startswith("Q")
-
     allowed_forms = {"10-K", "10-K/A"} if period == "annual" else {"10-Q", "10-Q/A"}
 
-    series = {}  # end -> (filed, val)
+    series = pd.Series(dtype=float)  # end -> val
 
     for tag in preferred_tags:
         concept = facts.get(tag)
@@ -116,43 +208,22 @@ def get_cashflow_sbc(ticker: str, period: str = "annual") -> pd.DataFrame:
         if not usd_items:
             continue
 
-        for item in usd_items:
-            if not fp_ok(item.get("fp")):
-                continue
-
-            form = item.get("form")
-            if form and form not in allowed_forms:
-                continue
+        items_df = _facts_frame(usd_items, period, allowed_forms)
 
-            end = item.get("end")
-            val = item.get("val")
-            filed = item.get("filed") or ""
-
-            if end is None or val is None:
-                continue
+        # Prefer latest filed if duplicates exist
+        series = _latest_filed(items_df)
 
-            # Prefer latest filed if duplicates exist
-            prev = series.get(end)
-            if prev is None or filed > prev[0]:
-                series[end] = (filed, float(val))
-
-        if series:
+        if not series.empty:
             break
 
-    if not series:
+    if series.empty:
         raise ValueError(f"No cash-flow SBC data found for CIK {cik}")
 
-    data = {"Cash Flow SBC": {end: v for end, (_, v) in series.items()}}
-    df = pd.DataFrame(data).T.sort_index(axis=1, ascending=False).fillna(0)
-    return df
+    return _to_row_frame("Cash Flow SBC", series)
 
 def get_shares_repurchase(ticker: str, period: str = "annual") -> pd.DataFrame:
     cik = match_ticker_to_cik(ticker)
-
-    url = f"https://data.sec.gov/api/xbrl/companyfacts/CIK{cik}.json"
-    r = requests.get(url, headers=SEC_HEADERS)
-    r.raise_for_status()
-    company_facts = r.json()
+    company_facts = _fetch_companyfacts(cik)
 
     facts = company_facts.get("facts", {}).get("us-gaap", {})
 
@@ -163,41 +234,38 @@ def get_shares_repurchase(ticker: str, period: str = "annual") -> pd.DataFrame:
         "StockRepurchasedDuringPeriodValue",
     ]
 
-    def fp_ok(fp: str | None) -> bool:
-        if period == "annual":
-            return fp == "FY"
-        return isinstance(fp, str) and fp.startswith("Q")
+    series = pd.Series(dtype=float)  # end -> val
 
-    repurchase_data = {"Share Repurchase": {}}
+    # Exact tag lookup (case-insensitive fallback) rather than substring matching,
+    # which also picked up unrelated tags that merely contain a concept name
+    facts_lower = {key.lower(): concept for key, concept in facts.items()}
 
     for concept_name in repurchase_concepts:
-        for key, concept in facts.items():
-            if concept_name.lower() in key.lower():
-                units = concept.get("units", {})
-                for unit_type, periods_list in units.items():
-                    if unit_type != "USD":
-                        continue
-                    for item in periods_list:
-                        if fp_ok(item.get("fp")):
-                            end = item.get("end")
-                            val = item.get("val")
-                            if end is None or val is None:
-                                continue
-                            # avoid silent overwrite: keep the latest filed if present
-                            prev = repurchase_data["Share Repurchase"].get(end)
-                            if prev is None:
-                                repurchase_data["Share Repurchase"][end] = val
-                            else:
-                                # if duplicates, keep max (simple heuristic)
-                                repurchase_data["Share Repurchase"][end] = max(prev, val)
-
-    # remove empty label
-    if not repurchase_data["Share Repurchase"]:
+        concept = facts.get(concept_name) or facts_lower.get(concept_name.lower())
+        if not concept:
+            continue
+
+        ends = []
+        vals = []
+        for item in concept.get("units", {}).get("USD", []):
+            end = item.get("end")
+            val = item.get("val")
+            if end is None or val is None or not _fp_ok(item.get("fp"), period):
+                continue
+            ends.append(end)
+            vals.append(val)
+
+        # if duplicates, keep max (simple heuristic)
+        series = pd.Series(vals, index=ends, dtype=np.float64).groupby(level=0).max()
+
+        # if we found data in this preferred tag, stop searching fallbacks
+        if not series.empty:
+            break
+
+    if series.empty:
         raise ValueError(f"No share repurchase data found for CIK {cik}")
 
-    df = pd.DataFrame(repurchase_data).T
-    df = df.sort_index(axis=1, ascending=False).fillna(0)
-    return df
+    return _to_row_frame("Share Repurchase", series)
 
 def get_diluted_shares_outstanding(
     ticker: str,
@@ -222,11 +290,7 @@ def get_diluted_shares_outstanding(
         DataFrame with one row ("Shares Outstanding (Period-End)") and period end dates as columns.
     """
     cik = match_ticker_to_cik(ticker)
-
-    url = f"https://data.sec.gov/api/xbrl/companyfacts/CIK{cik}.json"
-    r = requests.get(url, headers=SEC_HEADERS, timeout=30)
-    r.raise_for_status()
-    j = r.json()
+    j = _fetch_companyfacts(cik)
 
     # Prefer cover page shares outstanding (dei) then fall back to us-gaap.
     dei = j.get("facts", {}).get("dei", {}) or {}
@@ -239,58 +303,34 @@ def get_diluted_shares_outstanding(
         ("us-gaap", "CommonStockSharesOutstanding"),
     ]
 
-    def fp_ok(fp: Optional[str]) -> bool:
-        if period == "annual":
-            return fp == "FY"
-        return isinstance(fp, str) and fp.startswith("Q")
-
     allowed_forms = {"10-K", "10-K/A"} if period == "annual" else {"10-Q", "10-Q/A"}
 
     # Keep best per end date: prefer latest filed
-    best: Dict[str, Tuple[str, float]] = {}  # end -> (filed, val)
+    best = pd.Series(dtype=float)  # end -> val
 
-    def ingest(concept: Dict[str, Any]) -> None:
+    def ingest(concept: Dict[str, Any]) -> pd.Series:
         units = concept.get("units", {}) or {}
         # Shares are commonly under "shares"
         items = units.get("shares", [])
-        for item in items:
-            end = item.get("end")
-            val = item.get("val")
-            filed = item.get("filed") or ""
-            form = item.get("form")
+        if not items:
+            return pd.Series(dtype=float)
 
-            if end is None or val is None:
-                continue
+        # Some dei facts may not have fp/form; be permissive for dei.
+        # For us-gaap, it's often present; for dei, fp can be missing.
+        # fp is only enforced if present.
+        items_df = _facts_frame(items, period, allowed_forms, fp_optional=True)
 
-            # Some dei facts may not have fp/form; be permissive for dei.
-            # For us-gaap, it's often present; for dei, fp can be missing.
-            if form and form not in allowed_forms:
-                continue
+        return _latest_filed(items_df)
 
-            fp = item.get("fp")
-            if fp is not None and not fp_ok(fp):
-                # only enforce fp if present
-                continue
-
-            prev = best.get(end)
-            if prev is None or filed > prev[0]:
-                best[end] = (filed, float(val))
-
-    found_any = False
     for namespace, tag in candidate_paths:
         concept = (dei if namespace == "dei" else gaap).get(tag)
         if concept:
-            ingest(concept)
-            if best:
-                found_any = True
-                # If we found data in the preferred (dei) tag, we can stop early.
-                if namespace == "dei":
-                    break
-
-    if not found_any or not best:
+            best = ingest(concept)
+            # If we found data in the preferred (dei) tag, we can stop early.
+            if not best.empty:
+                break
+
+    if best.empty:
         raise ValueError(f"No period-end shares outstanding found for ticker={ticker}, CIK={cik}")
 
-    series = {end: v for end, (_, v) in best.items()}
-    df = pd.DataFrame({"Shares Outstanding (Period-End)": series}).T
-    df = df.sort_index(axis=1, ascending=False).fillna(0)
-    return df
\ No newline at end of file
+    return _to_row_frame("Shares Outstanding (Period-End)", best)
\ No newline at end of file
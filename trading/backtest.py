@@ -2,7 +2,23 @@ import pandas as pd
 import numpy as np
 import yfinance as yf
 from datetime import datetime
+from functools import lru_cache
 import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from matplotlib.collections import PolyCollection
+
+def _cumulative_return(returns):
+    """
+    Compound periodic returns, treating NaN as 0.
+
+    Uses expm1(cumsum(log1p(r))), which is equivalent to (1 + r).cumprod() - 1.
+    Falls back to cumprod when a period loses 100% or more (e.g. a short whose
+    price more than doubles), where log1p is undefined.
+    """
+    r = np.nan_to_num(np.asarray(returns, dtype=np.float64), nan=0.0)
+    if np.all(r > -1):
+        return np.expm1(np.cumsum(np.log1p(r)))
+    return np.cumprod(1 + r) - 1
 
 def calculate_strategy_returns(df, ticker_name):
     """
@@ -27,7 +43,11 @@ def calculate_strategy_returns(df, ticker_name):
     if len(df) == 0:
         raise ValueError(f"No valid data rows found for {ticker_name}")
     
-    df = df.sort_values('date').reset_index(drop=True)
+    # Parse dates once here so downstream plotting can use them directly
+    df['date'] = pd.to_datetime(df['date'])
+    if not df['date'].is_monotonic_increasing:
+        df = df.sort_values('date')
+    df = df.reset_index(drop=True)
     
     # Calculate price returns (percent change)
     df['price_return'] = df['closing_price'].pct_change()
@@ -40,21 +60,26 @@ def calculate_strategy_returns(df, ticker_name):
     
     # Calculate cumulative returns
     # Fill NaN values with 0 for the first row (no previous price)
-    df['cumulative_market_return'] = (1 + df['price_return'].fillna(0)).cumprod() - 1
-    df['cumulative_strategy_return'] = (1 + df['strategy_return'].fillna(0)).cumprod() - 1
+    df['cumulative_market_return'] = _cumulative_return(df['price_return'])
+    df['cumulative_strategy_return'] = _cumulative_return(df['strategy_return'])
     
     return df
 
 def get_sp500_data(start_date, end_date):
     # Ensure dates are in the correct format for yfinance
-    if isinstance(start_date, str):
-        start_date = pd.to_datetime(start_date)
-    if isinstance(end_date, str):
-        end_date = pd.to_datetime(end_date)
+    # (and normalized so equivalent dates share a cache entry)
+    start_date = pd.to_datetime(start_date)
+    end_date = pd.to_datetime(end_date)
     
     # Add one day to end_date to ensure we get data up to that date
     end_date = end_date + pd.Timedelta(days=1)
-    
+
+    # Copy so callers can't modify the cached frame
+    return _download_sp500(start_date, end_date).copy()
+
+@lru_cache(maxsize=32)
+def _download_sp500(start_date, end_date):
+    # Cached per date range; the S&P 500 baseline is identical across tickers and reruns
     sp500 = yf.download(
         "^GSPC",
         start=start_date,
@@ -63,6 +88,11 @@ def get_sp500_data(start_date, end_date):
         auto_adjust=False,   # set explicitly to silence FutureWarning + keep schema stable
     )
 
+    # yfinance usually signals a failed download with an empty frame rather than
+    # raising; raise here so lru_cache doesn't keep the empty result
+    if sp500.empty:
+        raise ValueError(f"No S&P 500 data returned for {start_date.date()}..{end_date.date()}")
+
     # Robustly extract Close as a 1-D Series
     close = sp500["Close"]
     if isinstance(close, pd.DataFrame):
@@ -71,9 +101,10 @@ def get_sp500_data(start_date, end_date):
 
     sp500_df = close.rename("sp500_price").reset_index()  # Date -> column
     sp500_df = sp500_df.rename(columns={"Date": "date"})  # yfinance uses "Date"
+    sp500_df["date"] = pd.to_datetime(sp500_df["date"])
 
     sp500_df["sp500_return"] = sp500_df["sp500_price"].pct_change()
-    sp500_df["sp500_cumulative_return"] = (1 + sp500_df["sp500_return"].fillna(0)).cumprod() - 1
+    sp500_df["sp500_cumulative_return"] = _cumulative_return(sp500_df["sp500_return"])
 
     return sp500_df
 
@@ -81,11 +112,9 @@ def plot_positions(df, ticker_name):
     """Plot the trading positions over time."""
     fig, ax = plt.subplots(figsize=(14, 6))
     
-    df['date_dt'] = pd.to_datetime(df['date'])
-    
     # Create a step plot for positions
-    ax.step(df['date_dt'], df['position'], where='post', linewidth=2, label='Position')
-    ax.fill_between(df['date_dt'], df['position'], step='post', alpha=0.3)
+    ax.step(df['date'], df['position'], where='post', linewidth=2, label='Position')
+    ax.fill_between(df['date'], df['position'], step='post', alpha=0.3)
     
     ax.set_xlabel('Date', fontsize=12)
     ax.set_ylabel('Position', fontsize=12)
@@ -106,25 +135,27 @@ def plot_performance_comparison(df, sp500_df, ticker_name):
     ax1 = plt.subplot(1, 2, 1)  # Left plot: performance comparison
     ax2 = plt.subplot(1, 2, 2)  # Right plot: position over time
     
-    df['date_dt'] = pd.to_datetime(df['date'])
-    sp500_df['date_dt'] = pd.to_datetime(sp500_df['date'])
-    
     # Ensure we have valid data
     if len(df) == 0:
         raise ValueError(f"No data to plot for {ticker_name}")
     if len(sp500_df) == 0:
         raise ValueError(f"No S&P 500 data available for the date range")
     
+    # Decimate markers to ~50 per series so long backtests don't draw one per point
+    markevery = max(1, len(df) // 50)
+
     # Plot strategy returns
-    ax1.plot(df['date_dt'], df['cumulative_strategy_return'] * 100, 
-            linewidth=2.5, label=f'{ticker_name} Strategy', marker='o', markersize=6)
+    ax1.plot(df['date'], df['cumulative_strategy_return'] * 100, 
+            linewidth=2.5, label=f'{ticker_name} Strategy', marker='o', markersize=6,
+            markevery=markevery)
     
     # Plot buy-and-hold returns
-    ax1.plot(df['date_dt'], df['cumulative_market_return'] * 100, 
-            linewidth=2.5, label=f'{ticker_name} Buy & Hold', marker='s', markersize=6)
+    ax1.plot(df['date'], df['cumulative_market_return'] * 100, 
+            linewidth=2.5, label=f'{ticker_name} Buy & Hold', marker='s', markersize=6,
+            markevery=markevery)
     
     # Plot S&P 500 returns
-    ax1.plot(sp500_df['date_dt'], sp500_df['sp500_cumulative_return'] * 100, 
+    ax1.plot(sp500_df['date'], sp500_df['sp500_cumulative_return'] * 100, 
             linewidth=2, label='S&P 500', alpha=0.8)
 
     # Calculate outperformance vs buy & hold and S&P 500
@@ -152,59 +183,39 @@ def plot_performance_comparison(df, sp500_df, ticker_name):
     )
     
     # Detect position changes and mark long/short entries
-    df_sorted = df.sort_values('date_dt').reset_index(drop=True)
-    df_sorted['position_shift'] = df_sorted['position'].shift(1)
-    # Shift cumulative return and date backward by 1 to get the values BEFORE the position change
-    df_sorted['cumulative_strategy_return_prev'] = df_sorted['cumulative_strategy_return'].shift(1)
-    df_sorted['date_dt_prev'] = df_sorted['date_dt'].shift(1)
-    
-    # For first positions (where position_shift is NaN), use current period's values
-    # For subsequent positions, use previous period's values
-    df_sorted['entry_date'] = df_sorted['date_dt_prev'].fillna(df_sorted['date_dt'])
-    df_sorted['entry_cumulative_return'] = df_sorted['cumulative_strategy_return_prev'].fillna(df_sorted['cumulative_strategy_return'])
-    
-    # Find entries into long positions (transition to 1, or first position if it's 1)
-    is_first_row = df_sorted['position_shift'].isna()
-    long_entries = df_sorted[
-        (df_sorted['position'] == 1) & 
-        (df_sorted['position_shift'] != 1) &
-        (df_sorted['entry_cumulative_return'].notna())
-    ]
-    
-    # Find entries into short positions (transition to -1, or first position if it's -1)
-    short_entries = df_sorted[
-        (df_sorted['position'] == -1) & 
-        (df_sorted['position_shift'] != -1) &
-        (df_sorted['entry_cumulative_return'].notna())
-    ]
-    
-    # Ensure mutual exclusivity: a row cannot be both long and short entry
-    # This handles edge cases where the first row might be incorrectly detected as both
-    common_indices = long_entries.index.intersection(short_entries.index)
-    if len(common_indices) > 0:
-        # For rows that appear in both, keep only the one matching the actual position
-        for idx in common_indices:
-            actual_position = df_sorted.loc[idx, 'position']
-            if actual_position == 1:
-                short_entries = short_entries.drop(idx)
-            elif actual_position == -1:
-                long_entries = long_entries.drop(idx)
-            else:
-                # If position is 0 or unexpected, remove from both
-                long_entries = long_entries.drop(idx)
-                short_entries = short_entries.drop(idx)
+    df_sorted = df.sort_values('date').reset_index(drop=True)
+    positions = df_sorted['position'].to_numpy()
+    cumulative_strategy_return = df_sorted['cumulative_strategy_return'].to_numpy(dtype=np.float64)
+
+    # The first row counts as an entry; afterwards only rows where the position changes
+    changed = np.empty(len(positions), dtype=bool)
+    changed[:1] = True
+    changed[1:] = positions[1:] != positions[:-1]
+
+    # Mark entries at the period BEFORE the position change
+    # (the first row has no previous period, so it uses its own values)
+    prev_idx = np.maximum(np.arange(len(positions)) - 1, 0)
+    entry_dates = df_sorted['date'].to_numpy()[prev_idx]
+    entry_cumulative_return = cumulative_strategy_return[prev_idx]
+    entry_cumulative_return = np.where(
+        np.isnan(entry_cumulative_return), cumulative_strategy_return, entry_cumulative_return
+    )
+    changed &= ~np.isnan(entry_cumulative_return)
+
+    long_idx = np.flatnonzero(changed & (positions == 1))
+    short_idx = np.flatnonzero(changed & (positions == -1))
     
     # Mark long entries with green upward triangles
-    if len(long_entries) > 0:
-        ax1.scatter(long_entries['entry_date'], 
-                  long_entries['entry_cumulative_return'] * 100,
+    if len(long_idx) > 0:
+        ax1.scatter(entry_dates[long_idx], 
+                  entry_cumulative_return[long_idx] * 100,
                   marker='^', s=150, color='green', zorder=5, 
                   label='Long Entry', edgecolors='darkgreen', linewidths=1.5)
     
     # Mark short entries with red downward triangles
-    if len(short_entries) > 0:
-        ax1.scatter(short_entries['entry_date'], 
-                  short_entries['entry_cumulative_return'] * 100,
+    if len(short_idx) > 0:
+        ax1.scatter(entry_dates[short_idx], 
+                  entry_cumulative_return[short_idx] * 100,
                   marker='v', s=150, color='red', zorder=5, 
                   label='Short Entry', edgecolors='darkred', linewidths=1.5)
     
@@ -216,28 +227,32 @@ def plot_performance_comparison(df, sp500_df, ticker_name):
     ax1.axhline(y=0, color='black', linestyle='--', alpha=0.5)
     
     # Plot position over time with improved styling
-    dates = df_sorted['date_dt'].values
-    positions = df_sorted['position'].values
+    dates = df_sorted['date'].values
     
     # Define colors for each position type (more vibrant and distinct)
     color_long = '#2ecc71'    # Green for long positions
     color_short = '#e74c3c'    # Red for short positions
     
-    # Create separate fills for each position type for clean colored regions
-    # Fill long positions (1) - from 0 to 1
-    long_positions = np.where(positions == 1, positions, 0)
-    ax2.fill_between(dates, 0, long_positions, step='post', 
-                     alpha=0.5, color=color_long, edgecolor='none')
-    
-    # Fill short positions (-1) - from -1 to 0
-    short_positions = np.where(positions == -1, positions, 0)
-    ax2.fill_between(dates, short_positions, 0, step='post', 
-                     alpha=0.5, color=color_short, edgecolor='none')
-    
     # Draw step line overlay for clarity with better styling
     ax2.step(dates, positions, where='post', 
             linewidth=2.5, color='#2c3e50', alpha=0.9, zorder=10)
     
+    # Fill long (0 to 1) and short (-1 to 0) regions as a single collection,
+    # one step='post' rectangle per run of identical positions
+    x = mdates.date2num(dates)
+    held = positions[:-1]  # position held over [dates[i], dates[i + 1])
+    run_starts = np.flatnonzero(np.diff(held, prepend=np.nan) != 0)
+    run_ends = np.append(run_starts[1:], len(held))
+    nonzero = held[run_starts] != 0
+    run_starts, run_ends = run_starts[nonzero], run_ends[nonzero]
+    
+    polygons = [
+        [(x[start], 0), (x[start], held[start]), (x[end], held[start]), (x[end], 0)]
+        for start, end in zip(run_starts, run_ends)
+    ]
+    facecolors = [color_long if held[start] == 1 else color_short for start in run_starts]
+    ax2.add_collection(PolyCollection(polygons, facecolors=facecolors, edgecolors='none', alpha=0.5))
+    
     # Style the plot
     ax2.set_xlabel('Date', fontsize=12, fontweight='medium')
     ax2.set_ylabel('Position', fontsize=12, fontweight='medium')